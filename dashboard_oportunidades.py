@@ -1,14 +1,19 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine, text
+from sqlalchemy.sql.elements import TextClause
 from urllib.parse import quote_plus
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
-from typing import List, Dict, Any
-import re
+from functools import lru_cache
 
-# Configuración básica de logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Configuración básica de logging (una sola vez por proceso, no en cada rerun del script)
+@st.cache_resource(show_spinner=False)  # Sin spinner: se ejecuta antes de st.set_page_config
+def _init_logging():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    return True
+
+_init_logging()
 
 # --- Configuración de la página ---
 st.set_page_config(
@@ -32,22 +37,78 @@ st.markdown("""
 
 st.markdown("""
     <style>
-    /* Reduce el tamaño de la fuente del VALOR de la métrica */
-    [data-testid="stMetricValue"] {
-        font-size: 1.5rem;
+    /* Grilla de productos: 2 tarjetas por fila (1 en pantallas angostas) */
+    .grilla-productos {
+        display: grid;
+        grid-template-columns: repeat(2, minmax(0, 1fr));
+        gap: 1rem;
+    }
+    @media (max-width: 640px) {
+        .grilla-productos {
+            grid-template-columns: 1fr;
+        }
+    }
+    /* Tarjeta: imagen + título + métricas en una sola fila */
+    .tarjeta {
+        display: flex;
+        align-items: center;
+        gap: 1rem;
+        height: 135px;
+        padding: 0.75rem 1rem;
+        border: 1px solid rgba(128, 128, 128, 0.3);
+        border-radius: 0.5rem;
+        overflow: hidden;
+    }
+    .tarjeta img {
+        width: 100px;
+        height: 100px;
+        object-fit: contain;
+        flex-shrink: 0;
     }
-    /* Reduce el tamaño de la fuente de la ETIQUETA de la métrica */
-    [data-testid="stMetricLabel"] {
+    .tarjeta-titulo {
+        flex: 3;
+        min-width: 0;
+        display: -webkit-box;
+        -webkit-line-clamp: 3;
+        -webkit-box-orient: vertical;
+        overflow: hidden;
+    }
+    .tarjeta-titulo a {
+        text-decoration: none;
+        color: inherit;
+    }
+    .tarjeta-metricas {
+        flex: 2;
+        display: flex;
+        gap: 1rem;
+    }
+    /* Tamaños de fuente de la ETIQUETA, el VALOR y el DELTA de cada métrica */
+    .metrica-etiqueta {
         font-size: 1rem;
     }
-    /* Reduce el tamaño de la fuente del DELTA de la métrica */
-    [data-testid="stMetricDelta"] {
+    .metrica-valor {
+        font-size: 1.5rem;
+    }
+    .metrica-delta {
         font-size: 1rem;
     }
-    
+    .metrica-delta.sube {
+        color: #09ab3b;
+    }
+    .metrica-delta.baja {
+        color: #ff2b2b;
+    }
+    </style>
 """, unsafe_allow_html=True)
 
 
+IMAGEN_PLACEHOLDER = "https://placehold.co/120x120/F0F2F6/31333F?text=Sin+Imagen"
+
+# Flechas de los deltas como SVG inline: toman el color del texto (verde/rojo) vía currentColor
+_FLECHA_SUBE = '<svg viewBox="0 0 10 10" width="0.7em" height="0.7em" fill="currentColor"><path d="M5 1 9 9H1z"/></svg>'
+_FLECHA_BAJA = '<svg viewBox="0 0 10 10" width="0.7em" height="0.7em" fill="currentColor"><path d="M1 1h8L5 9z"/></svg>'
+
+
 # --- Conexión a la Base de Datos (usando st.secrets) ---
 
 @st.cache_resource
@@ -61,7 +122,17 @@ def get_engine():
         db_name = st.secrets["db_name"]
         db_password_encoded = quote_plus(db_password_raw)
         conn_string = f"postgresql+psycopg://{db_user}:{db_password_encoded}@{db_host}:{db_port}/{db_name}"
-        return create_engine(conn_string)
+        # Pool chico: la app hace pocas consultas por rerun y casi todas salen del cache.
+        # pool_recycle corto para no reutilizar conexiones que el servidor ya cerró por inactividad.
+        # prepare_threshold=None desactiva las sentencias preparadas (incompatibles con poolers en modo transacción).
+        return create_engine(
+            conn_string,
+            pool_size=2,
+            max_overflow=2,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            connect_args={"prepare_threshold": None},
+        )
     except Exception as e:
         st.error(f"Error al configurar la conexión con la base de datos: {e}")
         st.stop()
@@ -70,23 +141,167 @@ engine = get_engine()
 
 # --- Funciones de Carga de Datos ---
 
-@st.cache_data(ttl=600) # Cache por 10 minutos
-def load_data(_engine, query, params=None):
+@lru_cache(maxsize=32)
+def _sql(query):
+    """Devuelve el TextClause de una consulta; se construye una sola vez por string de SQL."""
+    return text(query)
+
+# Consultas fijas, construidas una sola vez al importar el módulo.
+_SQL_FECHAS = text(
+    "SELECT MIN(fecha_extraccion) AS fecha_minima, MAX(fecha_extraccion) AS fecha_maxima "
+    "FROM public.fechas_mv;"
+)
+_SQL_CATEGORIAS = text(
+    "SELECT categoria_principal, categoria_secundaria FROM public.categorias_mv "
+    "ORDER BY categoria_principal, categoria_secundaria;"
+)
+
+def _ejecutar_consulta(_engine, query, params=None):
     """
-    Ejecuta una consulta SQL y devuelve un DataFrame de pandas.
-    Los resultados se cachean.
+    Ejecuta una consulta SQL sin cache y devuelve un DataFrame de pandas.
+    Propaga las excepciones para que las funciones cacheadas no guarden errores.
+    `query` puede ser un string de SQL o un TextClause ya construido.
     """
-    if _engine is None:
-        return pd.DataFrame()
-    try:
-        with _engine.connect() as connection:
-            df = pd.read_sql(text(query), connection, params=params)
-            logging.info(f"Consulta ejecutada exitosamente, {len(df)} filas obtenidas.")
-            return df
-    except Exception as e:
-        st.error(f"Error al ejecutar la consulta: {e}")
-        logging.error(f"Error en la consulta: {query} - {e}")
-        return pd.DataFrame()
+    sentencia = query if isinstance(query, TextClause) else _sql(query)
+    with _engine.connect() as connection:
+        # Columnas respaldadas por Arrow: strings compactos en lugar de arrays de objetos de Python
+        df = pd.read_sql(sentencia, connection, params=params, dtype_backend="pyarrow")
+    logging.info(f"Consulta ejecutada exitosamente, {len(df)} filas obtenidas.")
+    return df
+
+@st.cache_data(ttl=3600) # Cache por 1 hora
+def load_rango_fechas():
+    """
+    Devuelve (fecha_minima, fecha_maxima) de las fechas con datos,
+    o None si todavía no hay fechas cargadas.
+    """
+    fechas = _ejecutar_consulta(get_engine(), _SQL_FECHAS)
+    # MIN/MAX siempre devuelven una fila; con la vista vacía ambos valores son NULL.
+    fecha_minima, fecha_maxima = fechas.iloc[0]
+    if pd.isna(fecha_maxima):
+        return None
+    return fecha_minima, fecha_maxima
+
+@st.cache_data(persist="disk", max_entries=2) # Persistido en disco: sobrevive a los reinicios de la app
+def load_categorias(dia, franja):
+    """
+    Devuelve el árbol de categorías en una sola consulta:
+    {categoria_principal: [categorias_secundarias]}, ambos niveles ordenados.
+    `dia` y `franja` (hora // 6) solo forman parte de la clave del cache: Streamlit ignora
+    el ttl en los caches persistidos, así que la clave cambia cada 6 horas y renueva las categorías.
+    """
+    df = _ejecutar_consulta(get_engine(), _SQL_CATEGORIAS)
+    categorias = {}
+    for principal, secundaria in df.itertuples(index=False, name=None):
+        secundarias = categorias.setdefault(principal, [])
+        if pd.notna(secundaria):
+            secundarias.append(secundaria)
+    return categorias
+
+def _escapar_html(serie):
+    """Versión vectorizada de html.escape para una Serie de strings."""
+    return (
+        serie.str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+        .str.replace('"', "&quot;", regex=False)
+        .str.replace("'", "&#x27;", regex=False)
+    )
+
+def load_productos(fecha, cat_p, cat_s, limite, offset):
+    """
+    Devuelve una página de productos del día ya enriquecida: variaciones contra el día anterior,
+    precio y deltas formateados, e imagen y título ya armados como HTML.
+    No se cachea: lo que se cachea es la grilla ya armada.
+    """
+    filtro_categorias = "categoria_principal = :cat_p"
+    params = {
+        "fecha": fecha,
+        "fecha_anterior": fecha - timedelta(days=1),
+        "cat_p": cat_p,
+        "limite": limite,
+        "offset": offset,
+    }
+
+    if cat_s:
+        filtro_categorias += " AND categoria_secundaria = :cat_s"
+        params["cat_s"] = cat_s
+
+    # Cada producto de hoy se cruza con su fila de ayer en la misma consulta
+    # (prioriza el match por titulo, luego id_producto y por último link_publicacion;
+    # las claves vacías se tratan como NULL para que no matcheen entre sí)
+    # y las variaciones de ranking y precio se calculan en la base.
+    query_productos = f"""
+        WITH hoy AS (
+            SELECT posicion, titulo, precio, imagen, link_publicacion, id_producto
+            FROM public.productos_mas_vendidos
+            WHERE fecha_extraccion = :fecha
+            AND {filtro_categorias}
+            ORDER BY posicion ASC
+            LIMIT :limite OFFSET :offset
+        ),
+        ayer AS (
+            SELECT posicion, titulo, precio, link_publicacion, id_producto
+            FROM public.productos_mas_vendidos
+            WHERE fecha_extraccion = :fecha_anterior
+            AND {filtro_categorias}
+        )
+        SELECT h.posicion, h.titulo, h.precio, h.imagen, h.link_publicacion,
+               a.posicion - h.posicion AS variacion_ranking,
+               h.precio - a.precio AS variacion_precio
+        FROM hoy h
+        LEFT JOIN LATERAL (
+            SELECT ayer.posicion, ayer.precio
+            FROM ayer
+            WHERE ayer.titulo = NULLIF(h.titulo, '')
+               OR ayer.id_producto = NULLIF(h.id_producto, '')
+               OR ayer.link_publicacion = NULLIF(h.link_publicacion, '')
+            ORDER BY
+                CASE
+                    WHEN ayer.titulo = NULLIF(h.titulo, '') THEN 0
+                    WHEN ayer.id_producto = NULLIF(h.id_producto, '') THEN 1
+                    ELSE 2
+                END,
+                ayer.posicion ASC
+            LIMIT 1
+        ) a ON TRUE
+        ORDER BY h.posicion ASC
+    """
+    df_productos = _ejecutar_consulta(get_engine(), query_productos, params)
+    if df_productos.empty:
+        return df_productos
+
+    # Formateo de precios y deltas en una sola pasada por columna, fuera del armado de tarjetas.
+    # Las variaciones NULL (sin match ayer) no muestran delta de precio y marcan el ranking como "IN".
+    # Un delta de precio que redondea a 0 tampoco se muestra: perdería el signo y se vería como suba.
+    df_productos["precio_fmt"] = [format_price(v) for v in df_productos["precio"].to_numpy()]
+    df_productos["delta_precio_fmt"] = [
+        format_price(v) if not pd.isna(v) and round(v) != 0 else None
+        for v in df_productos["variacion_precio"].to_numpy()
+    ]
+    df_productos["delta_ranking_fmt"] = [
+        "IN" if pd.isna(v) else (None if v == 0 else f"{int(v):+#,}")
+        for v in df_productos["variacion_ranking"].to_numpy()
+    ]
+
+    # Tag <img> de cada producto armado sobre toda la columna (placeholder si no tiene imagen)
+    imagenes = df_productos["imagen"].astype("string[pyarrow]")
+    imagen_url = _escapar_html(imagenes.where(imagenes.notna() & imagenes.ne(""), IMAGEN_PLACEHOLDER))
+    df_productos["imagen_html"] = '<img src="' + imagen_url + '" loading="lazy" decoding="async">'
+
+    # Link con el título de cada producto, escapado y armado sobre toda la columna
+    titulos = _escapar_html(df_productos["titulo"].astype("string[pyarrow]").fillna(""))
+    links = _escapar_html(df_productos["link_publicacion"].astype("string[pyarrow]").fillna(""))
+    df_productos["titulo_html"] = (
+        '<a href="' + links + '" target="_blank" title="' + titulos + '">' + titulos + '</a>'
+    )
+
+    return df_productos
+
+@lru_cache(maxsize=4096)
+def _fmt(n: int) -> str:
+    """Formatea un entero con punto como separador de miles."""
+    return f"{n:,}".replace(",", ".")
 
 def format_price(value: float) -> str:
     """
@@ -95,92 +310,82 @@ def format_price(value: float) -> str:
     Ejemplo: 1234567.89 -> '1.234.568'
     """
     # --- AÑADIR ESTA VALIDACIÓN ---
-    # Si el valor es None, no se puede formatear, devolvemos None.
-    if value is None:
+    # Si el valor es None (o NaN), no se puede formatear, devolvemos None.
+    if pd.isna(value):
         return None
         
-    # Si el valor es un número, lo formatea como antes.
-    return f"{value:,.0f}".replace(",", ".")
+    # Si el valor es un número, lo redondea a entero y usa el formato cacheado.
+    return _fmt(round(value))
 
 
-def calcular_variaciones(productos_hoy: List[Dict[str, Any]], productos_ayer: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _delta_html(delta):
     """
-    Analiza los productos de hoy y ayer para calcular la variación de ranking y precio.
-    - Prioriza matching por titulo
-    - Fallback en id_producto
-    - Fallback en link_publicacion
+    Devuelve el HTML del delta de una métrica: verde con flecha arriba si es positivo
+    y rojo con flecha abajo si empieza con '-'. Sin delta devuelve un string vacío.
     """
+    if delta is None:
+        return ""
+    if delta.startswith("-"):
+        return f'<div class="metrica-delta baja">{_FLECHA_BAJA} {delta}</div>'
+    return f'<div class="metrica-delta sube">{_FLECHA_SUBE} {delta}</div>'
+
+
+def _metrica_html(etiqueta, valor, delta):
+    """Arma el HTML de una métrica (etiqueta, valor y delta opcional)."""
+    return (
+        f'<div class="metrica">'
+        f'<div class="metrica-etiqueta">{etiqueta}</div>'
+        f'<div class="metrica-valor">{valor}</div>'
+        f'{_delta_html(delta)}'
+        f'</div>'
+    )
+
+
+# Columnas que consume _tarjeta_html, en el orden de sus parámetros
+_COLUMNAS_TARJETA = (
+    "posicion", "precio", "titulo_html", "imagen_html",
+    "precio_fmt", "delta_precio_fmt", "delta_ranking_fmt",
+)
 
-    def _parse_price(x):
-        if x is None:
-            return None
-        try:
-            return float(x)
-        except Exception:
-            s = str(x).strip()
-            digits = re.sub(r'[^\d]', '', s)
-            return float(digits) if digits else None
-
-    if not productos_ayer:
-        for p in productos_hoy:
-            p['variacion_ranking'] = None
-            p['variacion_precio'] = None
-            p['ranking_anterior'] = None
-        return productos_hoy
-
-    df_ayer = pd.DataFrame(productos_ayer).copy()
-    for col in ['id_producto', 'link_publicacion', 'posicion', 'precio', 'titulo']:
-        if col not in df_ayer.columns:
-            df_ayer[col] = None
-    df_ayer['precio_norm'] = df_ayer['precio'].apply(_parse_price)
-
-    productos_enriquecidos = []
-    for producto_hoy in productos_hoy:
-        pid = producto_hoy.get('id_producto')
-        link = producto_hoy.get('link_publicacion')
-        titulo_hoy = producto_hoy.get('titulo')
-        ranking_actual = producto_hoy.get('posicion')
-        precio_actual = _parse_price(producto_hoy.get('precio'))
-
-        producto_hoy['variacion_ranking'] = None
-        producto_hoy['variacion_precio'] = None
-        producto_hoy['ranking_anterior'] = None
-
-        fila_anterior = None
-        # match por titulo
-        if titulo_hoy:
-            mask = df_ayer['titulo'] == titulo_hoy
-            if mask.any():
-                fila_anterior = df_ayer[mask].iloc[0]
-
-        # fallback por id
-        if fila_anterior is None and pid:
-            mask = df_ayer['id_producto'] == pid
-            if mask.any():
-                fila_anterior = df_ayer[mask].iloc[0]
-
-        # fallback por link
-        if fila_anterior is None and link:
-            mask2 = df_ayer['link_publicacion'] == link
-            if mask2.any():
-                fila_anterior = df_ayer[mask2].iloc[0]
-
-        if fila_anterior is not None:
-            try:
-                ranking_anterior = int(fila_anterior.get('posicion')) if fila_anterior.get('posicion') is not None else None
-            except Exception:
-                ranking_anterior = None
-            precio_anterior = fila_anterior.get('precio_norm')
-
-            if ranking_anterior is not None and ranking_actual is not None:
-                producto_hoy['variacion_ranking'] = ranking_anterior - ranking_actual
-                producto_hoy['ranking_anterior'] = ranking_anterior
-            if precio_anterior is not None and precio_actual is not None:
-                producto_hoy['variacion_precio'] = precio_actual - precio_anterior
-
-        productos_enriquecidos.append(producto_hoy)
-
-    return productos_enriquecidos
+
+def _tarjeta_html(posicion, precio, titulo_html, imagen_html,
+                  precio_fmt, delta_precio_fmt, delta_ranking_fmt):
+    """
+    Arma el HTML de la tarjeta de un producto: imagen, título con link,
+    precio con su variación y posición en el ranking con su variación.
+    """
+    # El HTML de imagen y título y los textos de valores y deltas llegan ya armados desde load_productos
+    metricas = ""
+    if precio_fmt is not None and precio != 0:
+        metricas += _metrica_html("Precio", f"${precio_fmt}", delta_precio_fmt)
+    metricas += _metrica_html("Top", f"{posicion}", delta_ranking_fmt)
+
+    # Sin saltos de línea ni indentación: el markdown de Streamlit trataría las líneas indentadas como código
+    return (
+        f'<div class="tarjeta">'
+        f'{imagen_html}'
+        f'<div class="tarjeta-titulo">{titulo_html}</div>'
+        f'<div class="tarjeta-metricas">{metricas}</div>'
+        f'</div>'
+    )
+
+
+@st.cache_data(ttl=600, max_entries=128, show_spinner=False) # Cache por 10 minutos, hasta 128 páginas
+def load_grilla_html(fecha, cat_p, cat_s, limite, offset):
+    """
+    Devuelve el HTML completo de la grilla para una página de productos, o None si no hay productos.
+    Se cachea por filtros y página: un rerun con los mismos valores no consulta la base
+    ni vuelve a armar las tarjetas.
+    """
+    df_productos = load_productos(fecha, cat_p, cat_s, limite, offset)
+    if df_productos.empty:
+        return None
+
+    # Toda la grilla se envía en un único bloque HTML en lugar de varios elementos de Streamlit por tarjeta
+    # Se recorren los arrays de cada columna en paralelo, sin armar una fila (tupla con nombre) por producto
+    columnas = [df_productos[columna].to_numpy() for columna in _COLUMNAS_TARJETA]
+    tarjetas = "".join(_tarjeta_html(*valores) for valores in zip(*columnas))
+    return f'<div class="grilla-productos">{tarjetas}</div>'
 
 
 # --- Sidebar de Filtros ---
@@ -188,35 +393,42 @@ def calcular_variaciones(productos_hoy: List[Dict[str, Any]], productos_ayer: Li
 st.sidebar.title("📡 Radar de Oportunidad")
 st.sidebar.header("Filtros")
 
-fechas = load_data(engine, "SELECT DISTINCT fecha_extraccion FROM public.productos_mas_vendidos ORDER BY fecha_extraccion DESC;")   
-if fechas.empty:   
-    st.error("No se pudieron cargar las fechas desde la base de datos.") 
+hoy = date.today()
+try:
+    rango_fechas = load_rango_fechas()
+except Exception as e:
+    st.error(f"Error al cargar las fechas: {e}")
+    logging.error(f"Error al cargar las fechas: {e}")
+    rango_fechas = None
+
+if rango_fechas is None:
+    st.error("No se pudieron cargar las fechas desde la base de datos.")
+    fecha_minima, fecha_maxima = hoy - timedelta(days=30), hoy
+else:
+    fecha_minima, fecha_maxima = rango_fechas
 
-fecha_maxima = fechas['fecha_extraccion'].max() if not fechas.empty else datetime.today().date()
-fecha_minima = fechas['fecha_extraccion'].min() if not fechas.empty else datetime.today().date() - timedelta(days=30)
 fecha_seleccionada = st.sidebar.date_input("Seleccione una Fecha", value=fecha_maxima, min_value=fecha_minima, max_value=fecha_maxima, format="DD/MM/YYYY")
 
 selected_cat_principal = None
 selected_cat_secundaria = None
 
-df_anterior = pd.DataFrame()
-
 if engine:
-    query_cat_principal = "SELECT DISTINCT categoria_principal FROM public.productos_mas_vendidos WHERE categoria_principal IS NOT NULL ORDER BY categoria_principal;"
-    df_cat_principal = load_data(engine, query_cat_principal)
-    categorias_principales = df_cat_principal["categoria_principal"].tolist()
-    
+    try:
+        categorias = load_categorias(hoy, datetime.now().hour // 6)
+    except Exception as e:
+        st.error(f"Error al cargar las categorías: {e}")
+        logging.error(f"Error al cargar las categorías: {e}")
+        categorias = {}
+    categorias_principales = list(categorias)
+
     if categorias_principales:
         selected_cat_principal = st.sidebar.selectbox(
             "Categoría Principal", options=categorias_principales, index=0
         )
 
     if selected_cat_principal:
-        query_cat_secundaria = "SELECT DISTINCT categoria_secundaria FROM public.productos_mas_vendidos WHERE categoria_principal = :cat_principal AND categoria_secundaria IS NOT NULL ORDER BY categoria_secundaria;"
-        params_sec = {"cat_principal": selected_cat_principal}
-        df_cat_secundaria = load_data(engine, query_cat_secundaria, params=params_sec)
-        categorias_secundarias = df_cat_secundaria["categoria_secundaria"].tolist()
-        
+        categorias_secundarias = categorias[selected_cat_principal]
+
         if categorias_secundarias:
             selected_cat_secundaria = st.sidebar.selectbox(
                 "Categoría Secundaria", options=categorias_secundarias, index=0
@@ -227,133 +439,51 @@ if engine:
             selected_marca = st.sidebar.selectbox(
                 "Marca", options=["Todas"], index=0, disabled=True
             )
-            
 
-# --- Lógica de la consulta principal (Día seleccionado) ---
-df_productos = pd.DataFrame()
-if engine and selected_cat_principal:
-    query_base = """
-        SELECT posicion, titulo, precio, imagen, link_publicacion, id_producto
-        FROM public.productos_mas_vendidos 
-        WHERE fecha_extraccion = :fecha 
-        AND categoria_principal = :cat_p
-    """
-    params = {"fecha": fecha_seleccionada, "cat_p": selected_cat_principal}
-
-    if selected_cat_secundaria:
-        query_base += " AND categoria_secundaria = :cat_s"
-        params["cat_s"] = selected_cat_secundaria
+# --- Página Principal ---
+st.title("Productos más vendidos")
+st.markdown(f"Mostrando resultados para la fecha: **{fecha_seleccionada.strftime('%d/%m/%Y')}**")
 
-    query_base += " ORDER BY posicion ASC"
-    df_productos = load_data(engine, query_base, params=params)
 
-# --- Consulta del día anterior ---
-df_anterior = pd.DataFrame()
-if engine and selected_cat_principal:
-    fecha_anterior = fecha_seleccionada - timedelta(days=1)
-    
-    query_anterior = """
-        SELECT posicion, titulo, precio, imagen, link_publicacion, id_producto
-        FROM public.productos_mas_vendidos
-        WHERE fecha_extraccion = :fecha
-        AND categoria_principal = :cat_p
+@st.fragment
+def render_productos(fecha, cat_p, cat_s):
+    """
+    Consulta los productos del día (con su variación contra el día anterior) y dibuja la grilla.
+    Al ser un fragmento, cambiar de página solo vuelve a ejecutar esta función, no el sidebar.
     """
-    params_anterior = {"fecha": fecha_anterior, "cat_p": selected_cat_principal}
+    # --- Paginación (limita las filas que viajan desde la base y las tarjetas renderizadas) ---
+    col_tamano, col_pagina, _ = st.columns([1, 1, 4])
+    with col_tamano:
+        productos_por_pagina = st.number_input(
+            "Productos por página", min_value=10, max_value=200, value=50, step=10
+        )
+    with col_pagina:
+        # La key depende de los filtros: al cambiar fecha o categoría la página vuelve a 1.
+        pagina = st.number_input(
+            "Página", min_value=1, value=1, step=1, key=f"pagina-{fecha}-{cat_p}-{cat_s}"
+        )
 
-    if selected_cat_secundaria:
-        query_anterior += " AND categoria_secundaria = :cat_s"
-        params_anterior["cat_s"] = selected_cat_secundaria
-    
-    query_anterior += " ORDER BY posicion ASC"
-    df_anterior = load_data(engine, query_anterior, params=params_anterior)
+    try:
+        grilla_html = load_grilla_html(
+            fecha, cat_p, cat_s, productos_por_pagina, (pagina - 1) * productos_por_pagina
+        )
+    except Exception as e:
+        st.error(f"Error al cargar los productos: {e}")
+        logging.error(f"Error al cargar los productos: {e}")
+        return
 
+    if grilla_html is None and pagina > 1:
+        st.info(f"La página {pagina} no tiene productos: los filtros seleccionados tienen menos resultados. Vuelve a una página anterior.")
+        return
 
-# --- Página Principal ---
-# --- Página Principal ---
-st.title("Productos más vendidos")
-st.markdown(f"Mostrando resultados para la fecha: **{fecha_seleccionada.strftime('%d/%m/%Y')}**")
+    if grilla_html is None:
+        st.warning("No se encontraron productos con los filtros seleccionados. Intenta con otra fecha o categoría.")
+        return
 
-if df_productos.empty:
-    st.warning("No se encontraron productos con los filtros seleccionados. Intenta con otra fecha o categoría.")
-else:
-    productos_hoy = df_productos.to_dict(orient='records')
-    productos_ayer = df_anterior.to_dict(orient='records')
-    productos_analizados = calcular_variaciones(productos_hoy, productos_ayer)
-
-    # Ahora mostramos en filas de 2 columnas (grid horizontal más espaciosa)
-    for i in range(0, len(productos_analizados), 2):
-        cols = st.columns(2)  # solo 2 columnas por fila
-
-        for j, col in enumerate(cols):
-            if i + j < len(productos_analizados):
-                producto = productos_analizados[i + j]
-
-                ranking_actual = producto['posicion']
-                variacion_ranking = producto['variacion_ranking']
-                precio_actual = producto['precio']
-                variacion_precio = producto['variacion_precio']
-
-                with col:
-                    with st.container(border=True, height=135):  
-                        # 2 columnas principales: imagen + info
-                        img_col, info_col = st.columns([2, 10])  
-
-                        with img_col:
-                            if producto.get("imagen") and isinstance(producto["imagen"], str):
-                                st.image(producto["imagen"], width=100)
-                            else:
-                                st.image("https://placehold.co/120x120/F0F2F6/31333F?text=Sin+Imagen", width=100)
-
-                        with info_col:
-                            # --- Columnas para Título (izquierda) y Métricas (derecha) ---
-                            col_titulo, col_metricas = st.columns([3, 2]) # Ratio 60% título, 40% métricas
-
-                            with col_titulo:
-                                titulo_completo = producto['titulo']
-                                st.markdown(
-                                    f"""
-                                    <h6 style="margin-top: 10px; padding: 0;">
-                                        <a 
-                                            href="{producto['link_publicacion']}" 
-                                            target="_blank" 
-                                            title="{titulo_completo}"
-                                            style="text-decoration: none; color: inherit; font-weight: normal;"
-                                        >
-                                            {titulo_completo}
-                                        </a>
-                                    </h6>
-                                    """,
-                                    unsafe_allow_html=True,
-                                )
-
-                            with col_metricas:
-                                # Mantenemos tus columnas anidadas para alinear las dos métricas
-                                m1, m2 = st.columns([7, 3])
-                                with m1:
-                                    if precio_actual:
-                                        delta_precio = (
-                                            round(variacion_precio, 2)
-                                            if variacion_precio is not None and variacion_precio != 0
-                                            else None
-                                        )
-                                        st.metric(
-                                            label="Precio",
-                                            value=f"${format_price(precio_actual)}",
-                                            delta=format_price(delta_precio),
-                                        )
-
-                                with m2:
-                                    delta_ranking_texto = ""
-                                    if variacion_ranking is None:
-                                        delta_ranking_texto = "IN"
-                                    elif variacion_ranking == 0:
-                                        delta_ranking_texto = None
-                                    else:
-                                        delta_ranking_texto = f"{variacion_ranking:+#,}"
-
-                                    st.metric(
-                                        label="Top",
-                                        value=f"{ranking_actual}",
-                                        delta=delta_ranking_texto,
-                                    )
+    st.markdown(grilla_html, unsafe_allow_html=True)
 
+
+if engine and selected_cat_principal:
+    render_productos(fecha_seleccionada, selected_cat_principal, selected_cat_secundaria)
+else:
+    st.warning("No se encontraron productos con los filtros seleccionados. Intenta con otra fecha o categoría.")
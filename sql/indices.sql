@@ -0,0 +1,18 @@
+-- Índices de soporte para las consultas de dashboard_oportunidades.py.
+-- Se ejecutan una sola vez sobre la base; CONCURRENTLY evita bloquear la ingesta.
+
+-- Consulta principal (hoy y ayer): filtra por fecha y categorías y ordena por posicion.
+-- Con las columnas INCLUDE el planner la resuelve con un Index Only Scan, sin Sort.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pmv_fecha_categorias_posicion
+    ON public.productos_mas_vendidos (fecha_extraccion, categoria_principal, categoria_secundaria, posicion)
+    INCLUDE (titulo, precio, imagen, link_publicacion, id_producto);
+
+-- Cruce con el día anterior (LEFT JOIN LATERAL de la consulta principal): cada producto de hoy
+-- busca su fila de ayer por titulo, id_producto o link_publicacion. Con un índice por clave
+-- el planner resuelve el OR con un BitmapOr en lugar de recorrer toda la categoría de ayer.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pmv_fecha_titulo
+    ON public.productos_mas_vendidos (fecha_extraccion, titulo);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pmv_fecha_id_producto
+    ON public.productos_mas_vendidos (fecha_extraccion, id_producto);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pmv_fecha_link
+    ON public.productos_mas_vendidos (fecha_extraccion, link_publicacion);
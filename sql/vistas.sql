@@ -0,0 +1,22 @@
+-- Vistas materializadas que consulta dashboard_oportunidades.py.
+-- El job de ingesta debe refrescarlas después de cada carga:
+--     REFRESH MATERIALIZED VIEW CONCURRENTLY public.categorias_mv;
+--     REFRESH MATERIALIZED VIEW CONCURRENTLY public.fechas_mv;
+
+-- Árbol de categorías del sidebar: pocas filas en lugar de un DISTINCT sobre toda la tabla.
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.categorias_mv AS
+    SELECT DISTINCT categoria_principal, categoria_secundaria
+    FROM public.productos_mas_vendidos
+    WHERE categoria_principal IS NOT NULL;
+
+-- Índice único requerido por REFRESH ... CONCURRENTLY.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_categorias_mv
+    ON public.categorias_mv (categoria_principal, categoria_secundaria);
+
+-- Fechas con datos para el selector de fecha: una fila por día extraído.
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.fechas_mv AS
+    SELECT DISTINCT fecha_extraccion
+    FROM public.productos_mas_vendidos;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_fechas_mv
+    ON public.fechas_mv (fecha_extraccion);